@@ -7,12 +7,19 @@ FastAPI backend for SIH_final Cloudburst EWS
 - SSE stream of events (/stream/updates)
 - GET endpoints for dashboard polling
 - SMS alerts: Twilio if configured, else Textbelt fallback
+- Alert rules: indexed, hot-reloaded from data/alert_rules.json (/api/alert_rules)
+- Admission control: priority work gate + per-node token buckets (429/503)
+- State history: event log + checkpoints, point-in-time reads (/api/state_at)
 """
 
 import os
+import sys
 import json
+import math
 import asyncio
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
@@ -22,6 +29,14 @@ from fastapi.responses import JSONResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 import requests
 
+# Shared backend helpers (stormeye/ at the repo root)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from stormeye.admission import (
+    ADMIT_RETRY_AFTER, AdmissionGate, NodeRateLimiter, admission_middleware,
+)
+from stormeye.alerts import AlertRules, compile_alert_rules, format_alert_sms
+from stormeye.eventlog import EVENT_COMPACT_INTERVAL, EventLog, iso_utc, parse_ts
+
 # Optional Twilio
 try:
     from twilio.rest import Client as TwilioClient
@@ -41,12 +56,33 @@ PRED_JSON = DATA_DIR / "prediction.json"      # rolling blocks of predictions
 STAGE_STATE = DATA_DIR / "stage_state.json"   # persistent stage per node
 MANUAL_STAGE = DATA_DIR / "manual_stage.json" # manual override map
 LIVE_CSV = DATA_DIR / "live.csv"              # optional live.csv
+ALERT_RULES = DATA_DIR / "alert_rules.json"   # alert rule config (hot-reloaded)
+EVENTS_DIR = DATA_DIR / "events"              # state event log + checkpoints
 
 # In-memory queue for SSE
 sse_queue: asyncio.Queue = asyncio.Queue()
 
+# Admission control (see stormeye/admission.py) ---------------------------
+
+admission = AdmissionGate()
+node_limiter = NodeRateLimiter()
+
+def overloaded_response() -> JSONResponse:
+    return JSONResponse(
+        {"ok": False, "error": "server overloaded, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(ADMIT_RETRY_AFTER)},
+    )
+
 app = FastAPI(title="SIH Cloudburst Backend (FastAPI + SSE)")
 
+# Registered before CORS so that 429/503 responses still carry CORS headers
+app.middleware("http")(admission_middleware(
+    admission, overloaded_response,
+    exempt={"/status"},
+    streams={"/stream/updates"},  # admitted, but don't hold a slot while open
+))
+
 # Allow dashboard origin(s) — change for production
 app.add_middleware(
     CORSMiddleware,
@@ -197,6 +233,84 @@ def save_stage_state(state: Dict[str, Any]):
 def load_manual_override():
     return safe_read_json(MANUAL_STAGE, {})
 
+# Alert rules (engine lives in stormeye/alerts.py) ----------------------
+
+HW_METRICS = ["temperature", "pressure", "humidity", "rainfall_mm", "wind_speed"]
+
+alert_rules = AlertRules(ALERT_RULES)
+
+# SMS gets its own single worker so a slow gateway (6 s/number) never ties
+# up the default executor that ingest uses; at most SMS_MAX_PENDING sends
+# are queued, further alerts are still published over SSE but not texted.
+SMS_MAX_PENDING = int(os.getenv("SMS_MAX_PENDING", 100))
+sms_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sms")
+_sms_pending: set = set()
+
+def send_alert_sms_later(message: str) -> bool:
+    """Queue an SMS on the SMS worker; False if the queue is full"""
+    if len(_sms_pending) >= SMS_MAX_PENDING:
+        return False
+    fut = asyncio.get_running_loop().run_in_executor(sms_executor, send_alert_sms, message)
+    _sms_pending.add(fut)
+    fut.add_done_callback(_sms_pending.discard)
+    return True
+
+# State event log (see stormeye/eventlog.py) ----------------------------
+
+def current_state() -> Dict[str, Any]:
+    """State as stored on disk, used to seed an empty event log"""
+    return json_safe({
+        "hardware": safe_read_json(HW_JSON, {}),
+        "stage_state": load_stage_state(),
+        "manual_stage": load_manual_override(),
+        "alert_rules": alert_rules.config,
+    })
+
+event_log = EventLog(EVENTS_DIR, current_state)
+
+def record_event(key: str, value: Any, node: Optional[str] = None):
+    """Append one state mutation to the event log (best-effort, blocking)"""
+    try:
+        event_log.record(key, json_safe(value), node)
+    except Exception:
+        pass
+
+# All appends go through one writer thread so they land in the order they
+# were submitted. Async handlers submit right after their (on-loop) file
+# write; sync handlers write the file and submit under state_lock.
+log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eventlog")
+state_lock = threading.Lock()
+
+def submit_event(key: str, value: Any, node: Optional[str] = None):
+    """Queue an append on the log writer without waiting for it"""
+    return log_writer.submit(record_event, key, value, node)
+
+async def record_event_async(key: str, value: Any, node: Optional[str] = None):
+    await asyncio.wrap_future(submit_event(key, value, node))
+
+def on_rules_reload(config: Dict[str, Any]):
+    """Log every installed rule config, including hot-reloaded file edits"""
+    submit_event("alert_rules", config)
+
+alert_rules.on_reload = on_rules_reload
+
+_background_tasks: set = set()
+
+def spawn_background(coro):
+    """create_task, keeping a reference until the task is done"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def compact_event_log_forever():
+    while True:
+        try:
+            await asyncio.to_thread(event_log.compact)
+        except Exception:
+            pass
+        await asyncio.sleep(EVENT_COMPACT_INTERVAL)
+
 # --- End helpers --------------------------------------------------------
 
 # API endpoints ----------------------------------------------------------
@@ -223,12 +337,20 @@ async def ingest_hardware(payload: dict):
     if not payload or "node_id" not in payload:
         raise HTTPException(400, "node_id required")
     node = payload["node_id"]
+    wait = node_limiter.take(str(node))
+    if wait:
+        raise HTTPException(429, f"rate limit exceeded for {node}",
+                            headers={"Retry-After": str(math.ceil(wait))})
     # Append CSV for raw logging (best-effort)
     try:
         append_hw_csv(payload)
     except Exception:
         pass
 
+    # Alert level is derived from the rule engine, not trusted from the device
+    reading = {k: payload.get(k) for k in HW_METRICS if payload.get(k) is not None}
+    fired = alert_rules.evaluate(node, reading)
+
     # Prepare snapshot
     snap = {
         "stage": payload.get("stage", 1),
@@ -237,15 +359,21 @@ async def ingest_hardware(payload: dict):
         "humidity": payload.get("humidity"),
         "rainfall_mm": payload.get("rainfall_mm"),
         "wind_speed": payload.get("wind_speed"),
-        "alert": payload.get("alert", "NORMAL"),
+        "alert": alert_rules.level(node),
+        "device_alert": payload.get("alert"),
         "updated_at": datetime.utcnow().isoformat()
     }
     persist_hardware_snapshot(node, snap)
+    await record_event_async("hardware", snap, node=node)
 
     # Publish SSE event
     await publish_event({"type": "hardware", "node": node, "payload": snap})
 
-    return {"ok": True, "node": node}
+    for a in fired:
+        await publish_event({"type": "alert", "alert": a})
+        send_alert_sms_later(format_alert_sms(a))
+
+    return {"ok": True, "node": node, "alert": snap["alert"]}
 
 @app.post("/ingest/prediction")
 async def ingest_prediction(payload: dict):
@@ -281,17 +409,21 @@ async def ingest_prediction(payload: dict):
     # Publish SSE event + optional SMS if high risk
     await publish_event({"type": "prediction_block", "block": block})
 
-    # Check for high risk and send SMS if needed
+    # Run alert rules per row and send SMS for anything that fired
+    alerts = []
     try:
         for p in block:
-            score = float(p.get("risk_score", 0.0))
-            if score >= 75.0:
-                msg = f"ALERT: {p.get('node_id')} high risk={score:.1f} stage={p.get('stage_used')}"
-                send_alert_sms(msg)
+            if not isinstance(p, dict) or "node_id" not in p:
+                continue
+            reading = {k: v for k, v in p.items() if k not in ("node_id", "timestamp")}
+            for a in alert_rules.evaluate(p["node_id"], reading):
+                alerts.append(a)
+                await publish_event({"type": "alert", "alert": a})
+                send_alert_sms_later(format_alert_sms(a, f" stage={p.get('stage_used')}"))
     except Exception:
         pass
 
-    return {"ok": True, "len": len(block)}
+    return {"ok": True, "len": len(block), "alerts": len(alerts)}
 
 @app.get("/api/hardware_output")
 def api_hardware_output():
@@ -331,11 +463,49 @@ def api_manual_stage(payload: dict):
     """
     if not isinstance(payload, dict):
         raise HTTPException(400, "dict payload expected")
-    safe_write_json(MANUAL_STAGE, payload)
+    with state_lock:
+        safe_write_json(MANUAL_STAGE, payload)
+        appended = submit_event("manual_stage", payload)
+    appended.result()
     # publish event so UI can pick up
     asyncio.create_task(publish_event({"type": "manual_stage", "payload": payload}))
     return {"ok": True, "manual": payload}
 
+@app.get("/api/alert_rules")
+def api_alert_rules():
+    alert_rules.load()
+    return alert_rules.config
+
+@app.post("/api/alert_rules")
+def set_alert_rules(payload: dict):
+    """
+    Replace the alert rule config (same shape as alert_rules.json).
+    Rules are validated before being written; the next reading picks them up.
+    """
+    try:
+        compile_alert_rules(payload)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    with state_lock:
+        safe_write_json(ALERT_RULES, payload)
+        alert_rules.load(force=True)   # logs the new config via on_rules_reload
+    return {"ok": True, "rules": len(payload.get("rules", []) or [])}
+
+@app.get("/api/state_at")
+def api_state_at(ts: str):
+    """
+    State (hardware, stage_state, manual_stage, alert_rules) as it was at `ts`.
+    ts: epoch seconds or ISO-8601, e.g. /api/state_at?ts=2025-12-10T14:32:00
+    """
+    try:
+        t = parse_ts(ts)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    res = event_log.state_at(t)
+    if res is None:
+        raise HTTPException(404, "no state history at ts")
+    return {"ts": iso_utc(t), **res}
+
 @app.get("/stream/updates")
 async def stream_updates(request: Request):
     """
@@ -355,7 +525,10 @@ async def stream_updates(request: Request):
 def set_stage_state(payload: dict):
     if not isinstance(payload, dict):
         raise HTTPException(400, "dict payload expected")
-    save_stage_state(payload)
+    with state_lock:
+        save_stage_state(payload)
+        appended = submit_event("stage_state", payload)
+    appended.result()
     asyncio.create_task(publish_event({"type": "stage_state", "payload": payload}))
     return {"ok": True}
 
@@ -369,6 +542,10 @@ def api_debug():
         "manual_stage": load_manual_override()
     }
 
+@app.on_event("startup")
+async def start_background_tasks():
+    spawn_background(compact_event_log_forever())
+
 # Root
 @app.get("/")
 def root():
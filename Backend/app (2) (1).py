@@ -7,19 +7,32 @@
 # ✔ ingest/hardware only updates node0
 # ✔ Predictions & Live CSV fully App.jsx compatible
 # ✔ SSE /api/updates stable and push full snapshots
+# ✔ Admission control: priority work gate + per-node token buckets
+# ✔ State history: event log + checkpoints, GET /api/state_at?ts=
 # --------------------------------------------------------------
 
 import os
+import sys
 import json
+import math
 import random
 import asyncio
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sse_starlette.sse import EventSourceResponse
 
+# Shared backend helpers (stormeye/ at the repo root)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stormeye.admission import (
+    ADMIT_RETRY_AFTER, AdmissionGate, NodeRateLimiter, admission_middleware,
+)
+from stormeye.eventlog import EVENT_COMPACT_INTERVAL, EventLog, iso_utc, parse_ts
+
 
 # --------------------------------------------------------------
 # PATHS
@@ -33,6 +46,7 @@ PRED_JSON = os.path.join(DATA, "predictions.json")
 DEPLOY_JSON = os.path.join(DATA, "deploy_state.json")
 SMS_LOG = os.path.join(DATA, "sms_log.json")
 LIVE_CSV = os.path.join(DATA, "live.csv")
+EVENTS_DIR = os.path.join(DATA, "events")
 
 NODE_IDS = ["node0", "node1", "node2", "node3", "node4"]
 
@@ -155,11 +169,78 @@ def apply_stage3_effects(hw: Dict[str, Any], active: bool):
     return hw
 
 
+# --------------------------------------------------------------
+# STATE EVENT LOG (see stormeye/eventlog.py)
+# --------------------------------------------------------------
+event_log = EventLog(
+    EVENTS_DIR,
+    lambda: {"hardware": safe_read(HW_JSON, {}), "deploy": {}},
+)
+
+
+# One writer thread: appends land in the order handlers submitted them,
+# i.e. the order of their (on-loop) hardware_output.json writes.
+log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eventlog")
+_background_tasks: set = set()
+
+
+def record_events(events: List[tuple]):
+    """Append (key, value, node) mutations to the event log (best-effort, blocking)."""
+    for key, value, node in events:
+        try:
+            event_log.record(key, value, node)
+        except:
+            pass
+
+
+async def record_events_async(events: List[tuple]):
+    await asyncio.wrap_future(log_writer.submit(record_events, events))
+
+
+def spawn_background(coro):
+    """create_task, keeping a reference until the task is done."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def compact_event_log_forever():
+    while True:
+        try:
+            await asyncio.to_thread(event_log.compact)
+        except:
+            pass
+        await asyncio.sleep(EVENT_COMPACT_INTERVAL)
+
+
+# --------------------------------------------------------------
+# ADMISSION CONTROL (see stormeye/admission.py)
+# --------------------------------------------------------------
+admission = AdmissionGate()
+node_limiter = NodeRateLimiter()
+
+
+def overloaded_response() -> JSONResponse:
+    return JSONResponse(
+        {"ok": False, "error": "server overloaded, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(ADMIT_RETRY_AFTER)},
+    )
+
+
 # --------------------------------------------------------------
 # FASTAPI APP
 # --------------------------------------------------------------
 app = FastAPI(title="StormEye Backend")
 
+# Registered before CORS so 429/503 responses keep CORS headers
+app.middleware("http")(admission_middleware(
+    admission, overloaded_response,
+    exempt={"/_health"},
+    streams={"/api/updates"},   # admitted, but no slot held while open
+))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -169,6 +250,11 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def start_background_tasks():
+    spawn_background(compact_event_log_forever())
+
+
 @app.get("/")
 def home():
     return {"ok": True, "msg": "StormEye backend running"}
@@ -224,6 +310,11 @@ async def ingest_hw(payload: Dict[str, Any]):
     if nid != "node0":
         raise HTTPException(400, "Only node0 can ingest real hardware input")
 
+    wait = node_limiter.take(nid)
+    if wait:
+        raise HTTPException(429, f"rate limit exceeded for {nid}",
+                            headers={"Retry-After": str(math.ceil(wait))})
+
     hw = safe_read(HW_JSON, {})
 
     if "node0" not in hw:
@@ -237,6 +328,7 @@ async def ingest_hw(payload: Dict[str, Any]):
     hw["node0"]["updated_at"] = now_iso()
 
     safe_write(HW_JSON, hw)
+    await record_events_async([("hardware", hw["node0"], "node0")])
 
     asyncio.create_task(push_sse({
         "type": "hardware_update",
@@ -268,11 +360,33 @@ async def api_deploy(payload: Dict[str, Any]):
         hw = apply_stage3_effects(hw, active)
 
     safe_write(HW_JSON, hw)
+    events = [("hardware", hw[nid], nid) for nid in NODE_IDS if nid != "node0" and nid in hw]
+    events.append(("deploy", {"action": action, "active": active}, what))
+    await record_events_async(events)
 
     await push_sse({"type": "hardware_update", "data": hw})
     return {"ok": True, "what": what, "active": active}
 
 
+# --------------------------------------------------------------
+# POINT-IN-TIME STATE
+# --------------------------------------------------------------
+@app.get("/api/state_at")
+def api_state_at(ts: str):
+    """
+    Hardware + deploy state as the operator saw it at `ts`
+    (epoch seconds or ISO-8601, e.g. ?ts=2025-12-10T14:32:00).
+    """
+    try:
+        t = parse_ts(ts)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    res = event_log.state_at(t)
+    if res is None:
+        raise HTTPException(404, "No state history at ts")
+    return {"ts": iso_utc(t), **res}
+
+
 # --------------------------------------------------------------
 # SSE STREAM
 # --------------------------------------------------------------
@@ -322,4 +436,9 @@ async def sms_alert(payload: Dict[str, Any]):
 # --------------------------------------------------------------
 @app.get("/_health")
 def health():
-    return {"ok": True, "subscribers": len(_SUBS)}
+    return {
+        "ok": True,
+        "subscribers": len(_SUBS),
+        "inflight": admission.inflight,
+        "queued": admission.queued,
+    }
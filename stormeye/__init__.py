@@ -0,0 +1,4 @@
+"""
+Shared helpers for the StormEye backends (Back_end/app.py, Backend/app.py).
+Kept free of FastAPI so they can be imported and tested on their own.
+"""
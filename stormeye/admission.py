@@ -0,0 +1,194 @@
+"""
+Admission control for the ingest/dashboard endpoints.
+
+Every request takes a slot from a bounded pool before it is handled. When
+the pool is full, requests wait in a bounded priority queue:
+  0 real hardware > 1 predictions > 2 simulation/admin > 3 dashboard polls
+A full queue evicts its lowest-priority waiter for a more important request,
+otherwise the newcomer is shed (503). `hw_reserved` slots are only usable by
+real hardware so sensor ingest never queues behind slow polls or deploys.
+/ingest/hardware is additionally limited per node with a token bucket (429).
+The node id is only known once the handler has parsed the body, so the bucket
+is checked after the gate has admitted the request: a rate-limited node still
+takes (briefly) a hardware slot and can evict queued polls before its 429.
+
+Limits come from ADMIT_* / NODE_RATE / NODE_BURST environment variables.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+from typing import Any, Callable, Dict, List
+
+PRIO_HARDWARE, PRIO_PREDICTION, PRIO_ADMIN, PRIO_POLL = 0, 1, 2, 3
+
+ADMIT_MAX_INFLIGHT = int(os.getenv("ADMIT_MAX_INFLIGHT", 32))
+ADMIT_HW_RESERVED = int(os.getenv("ADMIT_HW_RESERVED", 4))
+ADMIT_MAX_QUEUE = int(os.getenv("ADMIT_MAX_QUEUE", 128))
+ADMIT_RETRY_AFTER = int(os.getenv("ADMIT_RETRY_AFTER", 2))
+# max seconds a request may wait for a slot, per priority class
+ADMIT_QUEUE_TIMEOUT = {PRIO_HARDWARE: 2.0, PRIO_PREDICTION: 5.0, PRIO_ADMIN: 5.0, PRIO_POLL: 1.0}
+
+NODE_RATE = float(os.getenv("NODE_RATE", 2.0))     # tokens per second per node
+NODE_BURST = float(os.getenv("NODE_BURST", 10.0))  # bucket size
+NODE_BUCKETS_MAX = int(os.getenv("NODE_BUCKETS_MAX", 10000))
+
+def request_priority(method: str, path: str) -> int:
+    if path == "/ingest/hardware":
+        return PRIO_HARDWARE
+    if path == "/ingest/prediction":
+        return PRIO_PREDICTION
+    if method not in ("GET", "HEAD"):
+        return PRIO_ADMIN
+    return PRIO_POLL
+
+class AdmissionGate:
+    """Bounded pool of work slots with a bounded priority wait queue"""
+
+    def __init__(self, max_inflight: int = ADMIT_MAX_INFLIGHT,
+                 hw_reserved: int = ADMIT_HW_RESERVED,
+                 max_queue: int = ADMIT_MAX_QUEUE,
+                 queue_timeout: Dict[int, float] = ADMIT_QUEUE_TIMEOUT):
+        self.max_inflight = max_inflight
+        self.hw_reserved = hw_reserved
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self._waiters: List[tuple] = []   # heap of (priority, seq, future)
+        self._seq = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _limit(self, priority: int) -> int:
+        if priority == PRIO_HARDWARE:
+            return self.max_inflight
+        return max(1, self.max_inflight - self.hw_reserved)
+
+    def _drop(self, entry: tuple):
+        try:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+
+    def _dispatch(self):
+        """Admit queued requests, best priority first, while slots are free"""
+        while self._waiters:
+            priority, _, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.inflight >= self._limit(priority):
+                break
+            heapq.heappop(self._waiters)
+            self.inflight += 1
+            fut.set_result(True)
+
+    async def acquire(self, priority: int) -> bool:
+        """
+        Take a work slot, waiting in the priority queue if none is free.
+        Returns False if the request should be shed.
+        """
+        if (self.inflight < self._limit(priority)
+                and (not self._waiters or self._waiters[0][0] > priority)):
+            self.inflight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            if not self._waiters:
+                return False
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                return False
+            self._drop(worst)
+            if not worst[2].done():
+                worst[2].set_result(False)
+        self._seq += 1
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, self._seq, fut)
+        heapq.heappush(self._waiters, entry)
+        try:
+            return await asyncio.wait_for(fut, self.queue_timeout[priority])
+        except asyncio.TimeoutError:
+            self._drop(entry)
+            # on 3.12+ _dispatch may hand us the slot just before the timeout fires
+            if fut.done() and not fut.cancelled() and fut.result():
+                return True
+            self._dispatch()
+            return False
+        except asyncio.CancelledError:
+            self._drop(entry)
+            if fut.done() and not fut.cancelled() and fut.result():
+                self.release()
+            raise
+
+    def release(self):
+        self.inflight -= 1
+        self._dispatch()
+
+class NodeRateLimiter:
+    """
+    Per-node token buckets. Node ids come from the client, so once the table
+    grows past `max_nodes` buckets that have refilled to `burst` (identical to
+    a fresh bucket) are evicted.
+    """
+
+    def __init__(self, rate: float = NODE_RATE, burst: float = NODE_BURST,
+                 clock: Callable[[], float] = time.monotonic,
+                 max_nodes: int = NODE_BUCKETS_MAX):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.max_nodes = max_nodes
+        self._buckets: Dict[str, List[float]] = {}   # node -> [tokens, last refill]
+        self._sweep_at = max_nodes
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _sweep(self, now: float):
+        for node in [n for n, (tokens, last) in self._buckets.items()
+                     if tokens + (now - last) * self.rate >= self.burst]:
+            del self._buckets[node]
+        # amortise: only sweep again once the table has doubled
+        self._sweep_at = max(self.max_nodes, 2 * len(self._buckets))
+
+    def take(self, node: str) -> float:
+        """
+        Spend one token from the node's bucket.
+        Returns 0 if allowed, else seconds until a token is available.
+        """
+        now = self.clock()
+        if node not in self._buckets and len(self._buckets) >= self._sweep_at:
+            self._sweep(now)
+        bucket = self._buckets.setdefault(node, [self.burst, now])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+def admission_middleware(gate: AdmissionGate, reject: Callable[[], Any],
+                         exempt=(), streams=()):
+    """
+    Build an `app.middleware("http")` function around `gate`.
+    `reject()` builds the 503 response; `streams` (SSE) are admitted but do
+    not hold a slot while open; `exempt` paths bypass the gate entirely.
+    """
+    async def admission_control(request, call_next):
+        path = request.url.path
+        if request.method == "OPTIONS" or path in exempt:
+            return await call_next(request)
+        if not await gate.acquire(request_priority(request.method, path)):
+            return reject()
+        if path in streams:
+            gate.release()
+            return await call_next(request)
+        try:
+            return await call_next(request)
+        finally:
+            gate.release()
+    return admission_control
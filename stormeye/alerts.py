@@ -0,0 +1,248 @@
+"""
+Alert rule engine.
+
+alert_rules.json:
+{
+  "regions": {"north": ["node0", "node1"]},
+  "rules": [
+    {"id": "high_risk", "metric": "risk_score", "type": "threshold", "op": ">=", "value": 75},
+    {"id": "rain_jump", "metric": "rainfall_mm", "type": "rate", "op": ">=", "value": 10,
+     "region": "north", "severity": "MEDIUM"},
+    {"id": "humid", "metric": "humidity", "type": "sustained", "op": ">=", "value": 90,
+     "samples": 3, "nodes": ["node0"]}
+  ]
+}
+
+threshold: breached while value <op> limit
+rate:      breached while (value - previous value of that node/metric) <op> limit
+sustained: breached once value <op> limit has held for `samples` consecutive
+           samples of that node
+
+A rule fires when a node enters breach and re-arms once it clears, so a
+storm that stays above a threshold produces one alert, not one per reading.
+
+Rules without "nodes"/"region" apply to every node; "nodes": [] or an empty
+region applies to none. Rules are compiled once into an index keyed by
+(node, metric), so a reading only visits the rules that could fire for it.
+"""
+
+import json
+import operator
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+RULE_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+RULE_TYPES = ("threshold", "rate", "sustained")
+SEVERITY_ORDER = ["NORMAL", "LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+# Matches the original hardcoded `risk_score >= 75.0` check
+DEFAULT_ALERT_RULES = {
+    "regions": {},
+    "rules": [
+        {"id": "high_risk", "metric": "risk_score", "type": "threshold",
+         "op": ">=", "value": 75.0, "severity": "HIGH"},
+    ],
+}
+
+def _is_str_list(v) -> bool:
+    return isinstance(v, list) and all(isinstance(x, str) for x in v)
+
+def compile_alert_rules(config: Dict[str, Any]) -> Dict[tuple, List[Dict[str, Any]]]:
+    """
+    Validate a rule config and build the (node, metric) -> rules index.
+    Node-agnostic rules are stored under (None, metric).
+    Raises ValueError on an invalid config.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("rule config must be an object")
+    regions = config.get("regions", {}) or {}
+    rules = config.get("rules", []) or []
+    if not isinstance(regions, dict) or not isinstance(rules, list):
+        raise ValueError("'regions' must be an object and 'rules' a list")
+    for name, members in regions.items():
+        if not _is_str_list(members):
+            raise ValueError(f"region '{name}' must be a list of node ids")
+
+    index: Dict[tuple, List[Dict[str, Any]]] = {}
+    seen = set()
+    for i, r in enumerate(rules):
+        if not isinstance(r, dict):
+            raise ValueError(f"rule #{i} must be an object")
+        rid = str(r.get("id") or f"rule{i}")
+        if rid in seen:
+            raise ValueError(f"duplicate rule id '{rid}'")
+        seen.add(rid)
+        metric = r.get("metric")
+        if not isinstance(metric, str) or not metric:
+            raise ValueError(f"rule '{rid}': metric must be a non-empty string")
+        kind = r.get("type", "threshold")
+        if kind not in RULE_TYPES:
+            raise ValueError(f"rule '{rid}': unknown type '{kind}'")
+        op = r.get("op", ">=")
+        if not isinstance(op, str) or op not in RULE_OPS:
+            raise ValueError(f"rule '{rid}': unknown op '{op}'")
+        try:
+            limit = float(r["value"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"rule '{rid}': numeric value required")
+        try:
+            samples = int(r.get("samples", 1))
+        except (TypeError, ValueError):
+            samples = 0
+        if samples < 1:
+            raise ValueError(f"rule '{rid}': samples must be >= 1")
+        severity = str(r.get("severity", "HIGH")).upper()
+        if severity not in SEVERITY_ORDER:
+            raise ValueError(f"rule '{rid}': unknown severity '{severity}'")
+
+        nodes = r.get("nodes")
+        region = r.get("region")
+        if nodes is not None and not _is_str_list(nodes):
+            raise ValueError(f"rule '{rid}': nodes must be a list of node ids")
+        if region is not None:
+            if not isinstance(region, str):
+                raise ValueError(f"rule '{rid}': region must be a string")
+            if region not in regions:
+                raise ValueError(f"rule '{rid}': unknown region '{region}'")
+        if nodes is None and region is None:
+            targets: List[Optional[str]] = [None]
+        else:
+            targets = sorted(set(nodes or []) | set(regions.get(region, [])))
+
+        compiled = {
+            "id": rid,
+            "metric": metric,
+            "type": kind,
+            "op": op,
+            "cmp": RULE_OPS[op],
+            "value": limit,
+            "samples": samples,
+            "severity": severity,
+            "message": r.get("message"),
+        }
+        for node in targets:
+            index.setdefault((node, metric), []).append(compiled)
+    return index
+
+class AlertRules:
+    """
+    Compiled rules from a JSON file, recompiled whenever its mtime changes
+    (a missing file falls back to `default`, a broken one keeps the last good
+    rules). Keeps the per-node state needed for rate/sustained rules and for
+    firing only on the transition into breach. `on_reload(config)` is called
+    (outside the rules lock) whenever a new config is installed.
+    """
+
+    def __init__(self, path: Path, default: Dict[str, Any] = DEFAULT_ALERT_RULES,
+                 on_reload: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.path = Path(path)
+        self.default = default
+        self.on_reload = on_reload
+        self.config: Dict[str, Any] = default
+        self._index: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._mtime: Optional[float] = -1.0   # -1 = not loaded yet, None = no file
+        self._lock = threading.RLock()
+        self._last: Dict[tuple, float] = {}    # (node, metric) -> previous sample
+        self._runs: Dict[tuple, int] = {}      # (rule_id, node) -> consecutive matches
+        self._active: Dict[str, Dict[str, str]] = {}   # node -> {rule_id: severity}
+
+    def _read(self):
+        try:
+            return json.loads(self.path.read_text())
+        except Exception:
+            return None
+
+    def load(self, force: bool = False) -> Dict[tuple, List[Dict[str, Any]]]:
+        """Return the compiled index, recompiling if the file changed"""
+        try:
+            mtime = self.path.stat().st_mtime if self.path.exists() else None
+        except OSError:
+            return self._index
+        if mtime == self._mtime and not force:
+            return self._index
+        with self._lock:
+            if mtime == self._mtime and not force:
+                return self._index
+            self._mtime = mtime
+            config = self.default if mtime is None else self._read()
+            try:
+                index = compile_alert_rules(config)
+            except Exception:
+                return self._index
+            ids = {r["id"] for rules in index.values() for r in rules}
+            for key in [k for k in self._runs if k[0] not in ids]:
+                del self._runs[key]
+            for active in self._active.values():
+                for rid in [rid for rid in active if rid not in ids]:
+                    del active[rid]
+            self.config, self._index = config, index
+        if self.on_reload:
+            self.on_reload(config)
+        return index
+
+    def evaluate(self, node: str, reading: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Evaluate one reading of `node` against the rules indexed for it.
+        Returns the alerts that started firing with this reading.
+        """
+        index = self.load()
+        fired = []
+        with self._lock:
+            active = self._active.setdefault(node, {})
+            for metric, raw in reading.items():
+                rules = index.get((node, metric), []) + index.get((None, metric), [])
+                if not rules:
+                    continue
+                try:
+                    value = float(raw)
+                except (TypeError, ValueError):
+                    continue
+                prev = self._last.get((node, metric))
+                self._last[(node, metric)] = value
+                for r in rules:
+                    if r["type"] == "threshold":
+                        breach = r["cmp"](value, r["value"])
+                    elif r["type"] == "rate":
+                        breach = prev is not None and r["cmp"](value - prev, r["value"])
+                    else:
+                        key = (r["id"], node)
+                        if r["cmp"](value, r["value"]):
+                            self._runs[key] = self._runs.get(key, 0) + 1
+                        else:
+                            self._runs.pop(key, None)
+                        breach = self._runs.get(key, 0) >= r["samples"]
+                    if not breach:
+                        active.pop(r["id"], None)
+                        continue
+                    if r["id"] in active:
+                        continue
+                    active[r["id"]] = r["severity"]
+                    fired.append({
+                        "rule_id": r["id"],
+                        "node_id": node,
+                        "metric": metric,
+                        "value": value,
+                        "severity": r["severity"],
+                        "message": r["message"],
+                    })
+        return fired
+
+    def level(self, node: str) -> str:
+        """Highest severity among the rules `node` is currently breaching"""
+        with self._lock:
+            severities = list(self._active.get(node, {}).values())
+        return max(severities, key=SEVERITY_ORDER.index, default="NORMAL")
+
+def format_alert_sms(alert: Dict[str, Any], extra: str = "") -> str:
+    if alert.get("message"):
+        return f"ALERT: {alert['node_id']} {alert['message']}"
+    return (f"ALERT: {alert['node_id']} {alert['severity']} {alert['rule_id']} "
+            f"{alert['metric']}={alert['value']:.1f}{extra}")
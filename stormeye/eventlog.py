@@ -0,0 +1,292 @@
+"""
+Append-only state event log with per-segment checkpoints.
+
+Every state mutation is appended to <dir>/seg-<start_ms>.jsonl as
+{"ts": epoch_s, "key": ..., "node": ... | null, "value": ...}
+(node null = replace state[key], else replace state[key][node]).
+A segment is rotated after `segment_max` events or `segment_seconds`, and
+each segment starts with a checkpoint ckpt-<start_ms>.json holding the full
+state at that moment, so state_at(ts) loads one checkpoint and replays at
+most one segment of events.
+
+compact() (run periodically, off the request path) rewrites closed segments
+older than `compact_days` to the last event per (key, node) every
+`compact_resolution` seconds (seg-<start_ms>.cmp.jsonl), then merges runs of
+adjacent compacted segments into one of at most `merge_bytes`, keeping only
+the checkpoint of the first segment in the run. Checkpoints are full-state
+snapshots and dominate disk use for large fleets, so merging is what keeps
+old history small. Segments older than `retention_days` are dropped together
+with their checkpoints.
+"""
+
+import os
+import json
+import math
+import time
+import bisect
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+EVENT_SEGMENT_MAX = int(os.getenv("EVENT_SEGMENT_MAX", 5000))
+EVENT_SEGMENT_SECONDS = int(os.getenv("EVENT_SEGMENT_SECONDS", 86400))
+EVENT_COMPACT_DAYS = float(os.getenv("EVENT_COMPACT_DAYS", 7))
+EVENT_COMPACT_RESOLUTION = float(os.getenv("EVENT_COMPACT_RESOLUTION", 60))
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", 365))
+EVENT_COMPACT_INTERVAL = float(os.getenv("EVENT_COMPACT_INTERVAL", 3600))
+# upper bound for a merged segment; also bounds the replay cost of state_at
+EVENT_MERGE_BYTES = int(os.getenv("EVENT_MERGE_BYTES", 4 * 1024 * 1024))
+
+def apply_event(state: Dict[str, Any], ev: Dict[str, Any]):
+    if ev.get("node") is None:
+        state[ev["key"]] = ev["value"]
+    else:
+        state.setdefault(ev["key"], {})[ev["node"]] = ev["value"]
+
+def parse_ts(value: str) -> float:
+    """
+    Epoch seconds or ISO-8601 (naive = UTC) -> epoch seconds.
+    Raises ValueError for unparsable or out-of-range times.
+    """
+    try:
+        ts = float(value)
+    except ValueError:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError("ts must be epoch seconds or ISO-8601")
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        ts = dt.timestamp()
+    if not math.isfinite(ts):
+        raise ValueError("ts must be finite")
+    try:
+        datetime.fromtimestamp(ts, timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        raise ValueError("ts out of range")
+    return ts
+
+def iso_utc(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+def _read_segment(p: Path) -> List[Dict[str, Any]]:
+    events = []
+    try:
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # torn write at the tail of the live segment
+                    continue
+    except OSError:
+        pass
+    return events
+
+def _write_atomic(p: Path, text: str):
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, p)
+
+def _json_copy(value):
+    return json.loads(json.dumps(value, default=str))
+
+class EventLog:
+    """
+    Segmented event log under `path`. `seed()` returns the current state and
+    is only used to write the first checkpoint of an empty log.
+    """
+
+    def __init__(self, path: Path, seed: Callable[[], Dict[str, Any]],
+                 segment_max: int = EVENT_SEGMENT_MAX,
+                 segment_seconds: int = EVENT_SEGMENT_SECONDS,
+                 compact_days: float = EVENT_COMPACT_DAYS,
+                 compact_resolution: float = EVENT_COMPACT_RESOLUTION,
+                 retention_days: float = EVENT_RETENTION_DAYS,
+                 merge_bytes: int = EVENT_MERGE_BYTES,
+                 clock: Callable[[], float] = time.time):
+        self.path = Path(path)
+        self.seed = seed
+        self.segment_max = segment_max
+        self.segment_seconds = segment_seconds
+        self.compact_days = compact_days
+        self.compact_resolution = compact_resolution
+        self.retention_days = retention_days
+        self.merge_bytes = merge_bytes
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._segments: List[int] = []          # sorted segment start times (ms)
+        self._files: Dict[int, Path] = {}
+        self._state: Optional[Dict[str, Any]] = None   # state at the log head
+        self._count = 0
+
+    def _checkpoint(self, start_ms: int) -> Path:
+        return self.path / f"ckpt-{start_ms}.json"
+
+    def _open_segment(self, start_ms: int):
+        _write_atomic(self._checkpoint(start_ms), json.dumps(self._state, default=str))
+        seg = self.path / f"seg-{start_ms}.jsonl"
+        seg.touch()
+        self._segments.append(start_ms)
+        self._files[start_ms] = seg
+        self._count = 0
+
+    def _ensure(self):
+        """Load the segment index and head state (call with _lock held)"""
+        if self._state is not None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        for p in self.path.glob("seg-*.jsonl"):
+            try:
+                start_ms = int(p.name.split(".")[0][len("seg-"):])
+            except ValueError:
+                continue
+            # a crash mid-compaction can leave both; the .cmp file is complete
+            if start_ms in self._files and not p.name.endswith(".cmp.jsonl"):
+                continue
+            if self._checkpoint(start_ms).exists():
+                self._files[start_ms] = p
+        self._segments[:] = sorted(self._files)
+        if not self._segments:
+            self._state = _json_copy(self.seed())
+            self._open_segment(int(self.clock() * 1000))
+            return
+        head = self._segments[-1]
+        state = json.loads(self._checkpoint(head).read_text(encoding="utf-8"))
+        events = _read_segment(self._files[head])
+        for ev in events:
+            apply_event(state, ev)
+        self._state, self._count = state, len(events)
+
+    @property
+    def checkpoints(self) -> int:
+        return len(list(self.path.glob("ckpt-*.json")))
+
+    @property
+    def segments(self) -> int:
+        with self._lock:
+            self._ensure()
+            return len(self._segments)
+
+    def record(self, key: str, value: Any, node: Optional[str] = None):
+        """
+        Append one state mutation. Blocking: handlers should submit it to a
+        single-worker executor so appends land in the order they were made.
+        """
+        with self._lock:
+            self._ensure()
+            now = self.clock()
+            now_ms = int(now * 1000)
+            head = self._segments[-1]
+            if self._count >= self.segment_max or now_ms - head >= self.segment_seconds * 1000:
+                self._open_segment(max(now_ms, head + 1))
+            ev = {"ts": now, "key": key, "node": node, "value": _json_copy(value)}
+            with open(self._files[self._segments[-1]], "a", encoding="utf-8") as f:
+                f.write(json.dumps(ev) + "\n")
+            apply_event(self._state, ev)
+            self._count += 1
+
+    def state_at(self, ts: float) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the state as of epoch `ts` from the nearest checkpoint plus
+        the events logged after it. None if ts predates the retained history.
+        """
+        for _ in range(2):
+            with self._lock:
+                self._ensure()
+                i = bisect.bisect_right(self._segments, int(ts * 1000)) - 1
+                if i < 0:
+                    return None
+                start_ms = self._segments[i]
+                seg = self._files[start_ms]
+            try:
+                state = json.loads(self._checkpoint(start_ms).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                state = None
+            events = _read_segment(seg)
+            # retry if the segment was compacted or expired while reading it
+            if state is not None and seg.exists():
+                break
+        else:
+            return None
+        applied = 0
+        for ev in events:
+            if ev["ts"] <= ts:
+                apply_event(state, ev)
+                applied += 1
+        return {
+            "checkpoint": iso_utc(start_ms / 1000),
+            "events_applied": applied,
+            "state": state,
+        }
+
+    def compact(self):
+        """
+        Compact / expire closed segments. Closed segments are immutable, so
+        the rewrite happens outside the lock; only index updates take it.
+        """
+        now = self.clock()
+        compact_before = (now - self.compact_days * 86400) * 1000
+        expire_before = (now - self.retention_days * 86400) * 1000
+        with self._lock:
+            self._ensure()
+            closed = [(s, e, self._files[s])
+                      for s, e in zip(self._segments[:-1], self._segments[1:])]
+        for start_ms, end_ms, seg in closed:
+            if end_ms < expire_before:
+                with self._lock:
+                    self._segments.remove(start_ms)
+                    del self._files[start_ms]
+                seg.unlink(missing_ok=True)
+                self._checkpoint(start_ms).unlink(missing_ok=True)
+            elif end_ms < compact_before and not seg.name.endswith(".cmp.jsonl"):
+                events = _read_segment(seg)
+                last = {}
+                for n, ev in enumerate(events):
+                    bucket = int(ev["ts"] // self.compact_resolution)
+                    last[(ev["key"], ev.get("node"), bucket)] = n
+                out = self.path / f"seg-{start_ms}.cmp.jsonl"
+                _write_atomic(out, "".join(json.dumps(events[n]) + "\n" for n in sorted(last.values())))
+                with self._lock:
+                    self._files[start_ms] = out
+                seg.unlink(missing_ok=True)
+        self._merge()
+
+    def _merge(self):
+        """Merge runs of adjacent compacted segments, dropping their checkpoints"""
+        with self._lock:
+            closed = [(s, self._files[s]) for s in self._segments[:-1]]
+        runs, run, size = [], [], 0
+        for start_ms, seg in closed:
+            try:
+                seg_size = seg.stat().st_size if seg.name.endswith(".cmp.jsonl") else None
+            except OSError:
+                seg_size = None
+            if seg_size is None or (run and size + seg_size > self.merge_bytes):
+                if len(run) > 1:
+                    runs.append(run)
+                run, size = [], 0
+            if seg_size is not None:
+                run.append((start_ms, seg))
+                size += seg_size
+        if len(run) > 1:
+            runs.append(run)
+
+        for run in runs:
+            first_ms, first = run[0]
+            events, last_ts = [], float("-inf")
+            for _, seg in run:
+                for ev in _read_segment(seg):
+                    # skip events already merged by a run interrupted mid-way
+                    if ev["ts"] > last_ts:
+                        events.append(ev)
+                        last_ts = ev["ts"]
+            _write_atomic(first, "".join(json.dumps(ev) + "\n" for ev in events))
+            with self._lock:
+                for start_ms, _ in run[1:]:
+                    self._segments.remove(start_ms)
+                    del self._files[start_ms]
+            for start_ms, seg in run[1:]:
+                seg.unlink(missing_ok=True)
+                self._checkpoint(start_ms).unlink(missing_ok=True)
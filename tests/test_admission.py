@@ -0,0 +1,132 @@
+import asyncio
+import math
+
+from stormeye.admission import (
+    PRIO_ADMIN, PRIO_HARDWARE, PRIO_POLL, PRIO_PREDICTION,
+    AdmissionGate, NodeRateLimiter, admission_middleware, request_priority,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_request_priority():
+    assert request_priority("POST", "/ingest/hardware") == PRIO_HARDWARE
+    assert request_priority("POST", "/ingest/prediction") == PRIO_PREDICTION
+    assert request_priority("POST", "/api/deploy") == PRIO_ADMIN
+    assert request_priority("GET", "/api/hardware_output") == PRIO_POLL
+
+
+def test_shedding_order():
+    gate = AdmissionGate(max_inflight=3, hw_reserved=1, max_queue=3)
+    order = []
+
+    async def job(name, priority, hold=0.05):
+        ok = await gate.acquire(priority)
+        order.append((name, ok))
+        if ok:
+            await asyncio.sleep(hold)
+            gate.release()
+
+    async def main():
+        polls = [asyncio.create_task(job(f"poll{i}", PRIO_POLL, 0.1)) for i in range(6)]
+        await asyncio.sleep(0.01)
+        hw = asyncio.create_task(job("hw", PRIO_HARDWARE))
+        pred = asyncio.create_task(job("pred", PRIO_PREDICTION))
+        await asyncio.gather(*polls, hw, pred)
+
+    run(main())
+    result = dict(order)
+    # polls only get the unreserved slots; hardware takes the reserved one at once
+    assert order[:2] == [("poll0", True), ("poll1", True)]
+    assert ("hw", True) in order[:4]
+    # queue full: the 6th poll is shed, then the newest poll is evicted for pred
+    assert result["poll5"] is False
+    assert result["poll4"] is False
+    assert result["pred"] is True
+    assert [n for n, ok in order if ok].index("pred") < [n for n, ok in order if ok].index("poll2")
+    assert gate.inflight == 0 and gate.queued == 0
+
+
+def test_queue_timeout_sheds():
+    gate = AdmissionGate(max_inflight=1, hw_reserved=0, max_queue=8,
+                         queue_timeout={PRIO_POLL: 0.01})
+
+    async def main():
+        assert await gate.acquire(PRIO_POLL)
+        assert not await gate.acquire(PRIO_POLL)
+        gate.release()
+
+    run(main())
+    assert gate.inflight == 0 and gate.queued == 0
+
+
+def test_token_bucket_retry_after():
+    now = [0.0]
+    limiter = NodeRateLimiter(rate=2.0, burst=3.0, clock=lambda: now[0])
+    assert [limiter.take("node0") for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = limiter.take("node0")
+    assert wait == 0.5 and math.ceil(wait) == 1
+    # buckets are per node
+    assert limiter.take("node1") == 0.0
+    now[0] = 0.5
+    assert limiter.take("node0") == 0.0
+
+
+class FakeRequest:
+    def __init__(self, method, path):
+        self.method = method
+        self.url = type("URL", (), {"path": path})()
+
+
+def test_middleware_rejects_when_saturated():
+    gate = AdmissionGate(max_inflight=1, hw_reserved=0, max_queue=0)
+    mw = admission_middleware(gate, lambda: 503, exempt={"/_health"})
+
+    async def ok(request):
+        return 200
+
+    async def main():
+        await gate.acquire(PRIO_HARDWARE)
+        assert await mw(FakeRequest("GET", "/api/hardware_output"), ok) == 503
+        assert await mw(FakeRequest("GET", "/_health"), ok) == 200
+        gate.release()
+        assert await mw(FakeRequest("GET", "/api/hardware_output"), ok) == 200
+
+    run(main())
+    assert gate.inflight == 0
+
+
+def test_slot_granted_at_timeout_is_kept(monkeypatch):
+    gate = AdmissionGate(max_inflight=1, hw_reserved=0, max_queue=8)
+
+    async def racy_wait_for(fut, timeout):
+        # what asyncio.timeout can do on 3.12+: result set, then timeout raised
+        gate.inflight += 1
+        fut.set_result(True)
+        raise asyncio.TimeoutError
+
+    async def main():
+        assert await gate.acquire(PRIO_POLL)
+        gate.inflight -= 1      # holder finishes without dispatching
+        monkeypatch.setattr(asyncio, "wait_for", racy_wait_for)
+        assert await gate.acquire(PRIO_POLL)
+        gate.release()
+
+    run(main())
+    assert gate.inflight == 0 and gate.queued == 0
+
+
+def test_full_buckets_are_evicted():
+    now = [0.0]
+    limiter = NodeRateLimiter(rate=1.0, burst=2.0, clock=lambda: now[0], max_nodes=4)
+    limiter.take("hot")
+    limiter.take("hot")
+    for i in range(3):
+        limiter.take(f"rand{i}")
+    now[0] = 1.0   # rand* have refilled to burst, "hot" has not
+    limiter.take("new")
+    assert len(limiter) == 2
+    assert limiter.take("hot") == 0.0
+    assert limiter.take("hot") > 0
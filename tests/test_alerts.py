@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+from stormeye.alerts import AlertRules, compile_alert_rules
+
+
+def make_rules(tmp_path, config):
+    path = tmp_path / "alert_rules.json"
+    path.write_text(json.dumps(config))
+    return AlertRules(path)
+
+
+def fired_ids(rules, node, reading):
+    return [a["rule_id"] for a in rules.evaluate(node, reading)]
+
+
+def test_default_rule_without_file(tmp_path):
+    rules = AlertRules(tmp_path / "missing.json")
+    assert fired_ids(rules, "node0", {"risk_score": 80}) == ["high_risk"]
+    assert rules.level("node0") == "HIGH"
+
+
+def test_threshold_fires_on_entry_and_rearms(tmp_path):
+    rules = AlertRules(tmp_path / "missing.json")
+    got = [len(rules.evaluate("node0", {"risk_score": s})) for s in (80, 80, 80, 50, 90)]
+    assert got == [1, 0, 0, 0, 1]
+
+
+def test_rate_rule(tmp_path):
+    rules = make_rules(tmp_path, {"rules": [
+        {"id": "jump", "metric": "rainfall_mm", "type": "rate", "op": ">=", "value": 10},
+    ]})
+    assert fired_ids(rules, "node1", {"rainfall_mm": 1}) == []
+    assert fired_ids(rules, "node1", {"rainfall_mm": 15}) == ["jump"]
+    assert fired_ids(rules, "node1", {"rainfall_mm": 16}) == []
+    assert rules.level("node1") == "NORMAL"
+
+
+def test_sustained_rule(tmp_path):
+    rules = make_rules(tmp_path, {"rules": [
+        {"id": "humid", "metric": "humidity", "type": "sustained", "value": 90,
+         "samples": 3, "severity": "MEDIUM"},
+    ]})
+    got = [len(rules.evaluate("node0", {"humidity": h})) for h in (95, 95, 95, 95, 50, 95)]
+    assert got == [0, 0, 1, 0, 0, 0]
+    assert rules.level("node0") == "NORMAL"
+
+
+def test_region_and_node_scoping(tmp_path):
+    rules = make_rules(tmp_path, {
+        "regions": {"north": ["node1"], "empty": []},
+        "rules": [
+            {"id": "north", "metric": "wind_speed", "value": 20, "region": "north"},
+            {"id": "only0", "metric": "wind_speed", "value": 20, "nodes": ["node0"]},
+            {"id": "none", "metric": "wind_speed", "value": 20, "nodes": []},
+            {"id": "empty", "metric": "wind_speed", "value": 20, "region": "empty"},
+        ],
+    })
+    assert fired_ids(rules, "node0", {"wind_speed": 30}) == ["only0"]
+    assert fired_ids(rules, "node1", {"wind_speed": 30}) == ["north"]
+    assert fired_ids(rules, "node2", {"wind_speed": 30}) == []
+
+
+@pytest.mark.parametrize("config", [
+    {"rules": [{"metric": "humidity", "value": 1, "nodes": [{"a": 1}]}]},
+    {"rules": [{"metric": ["humidity"], "value": 1}]},
+    {"rules": [{"metric": "humidity", "value": 1, "region": ["x"]}]},
+    {"regions": {"n": 5}, "rules": []},
+    {"regions": {"north": "node0"}, "rules": []},
+    {"rules": [{"metric": "humidity", "value": "high"}]},
+    {"rules": [{"metric": "humidity", "value": 1, "samples": None}]},
+])
+def test_invalid_configs_raise_value_error(config):
+    with pytest.raises(ValueError):
+        compile_alert_rules(config)
+
+
+def test_broken_file_keeps_last_good_rules(tmp_path):
+    rules = make_rules(tmp_path, {"rules": [{"id": "t", "metric": "temperature", "value": 40}]})
+    assert fired_ids(rules, "node0", {"temperature": 45}) == ["t"]
+    rules.path.write_text(json.dumps({"rules": [{"metric": ["temperature"], "value": 1}]}))
+    os.utime(rules.path, (1, 1))
+    assert fired_ids(rules, "node0", {"temperature": 30}) == []
+    assert fired_ids(rules, "node0", {"temperature": 45}) == ["t"]
+
+
+def test_hot_reload(tmp_path):
+    rules = make_rules(tmp_path, {"rules": []})
+    assert fired_ids(rules, "node0", {"pressure": 900}) == []
+    rules.path.write_text(json.dumps({"rules": [
+        {"id": "low", "metric": "pressure", "op": "<", "value": 950},
+    ]}))
+    os.utime(rules.path, (1, 1))
+    assert fired_ids(rules, "node0", {"pressure": 900}) == ["low"]
+
+
+def test_rule_reload_is_reported(tmp_path):
+    path = tmp_path / "alert_rules.json"
+    seen = []
+    rules = AlertRules(path, on_reload=seen.append)
+    rules.load()
+    path.write_text(json.dumps({"rules": []}))
+    os.utime(path, (1, 1))
+    rules.load()
+    rules.load()
+    assert [c.get("rules") for c in seen][1:] == [[]]
+    assert len(seen) == 2
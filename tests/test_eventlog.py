@@ -0,0 +1,118 @@
+import pytest
+
+from stormeye.eventlog import EventLog, parse_ts
+
+
+class Clock:
+    def __init__(self, t=1_700_000_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def make_log(tmp_path, **kw):
+    clock = Clock()
+    log = EventLog(tmp_path / "events", lambda: {"hardware": {"node0": {"t": -1}}},
+                   clock=clock, **kw)
+    return log, clock
+
+
+def test_checkpoint_plus_replay(tmp_path):
+    log, clock = make_log(tmp_path)
+    assert log.segments == 1   # seeds the first checkpoint at clock.t
+    marks = []
+    for i in range(3):
+        clock.t += 1
+        log.record("hardware", {"t": i}, node="node0")
+        log.record("manual_stage", {"node0": i})
+        marks.append(clock.t)
+    res = log.state_at(marks[1])
+    assert res["state"]["hardware"] == {"node0": {"t": 1}}
+    assert res["state"]["manual_stage"] == {"node0": 1}
+    assert res["events_applied"] == 4
+    # before the first event: the seeded checkpoint
+    assert log.state_at(marks[0] - 0.5)["state"] == {"hardware": {"node0": {"t": -1}}}
+    assert log.state_at(marks[0] - 10) is None
+
+
+def test_rotation_bounds_replay(tmp_path):
+    log, clock = make_log(tmp_path, segment_max=2)
+    for i in range(7):
+        clock.t += 1
+        log.record("hardware", {"t": i}, node="node1")
+    assert log.segments == 4
+    res = log.state_at(clock.t)
+    assert res["state"]["hardware"]["node1"] == {"t": 6}
+    assert res["events_applied"] <= 2
+    assert log.state_at(clock.t - 3)["state"]["hardware"]["node1"] == {"t": 3}
+
+
+def test_restart_replays_head(tmp_path):
+    log, clock = make_log(tmp_path, segment_max=2)
+    for i in range(3):
+        clock.t += 1
+        log.record("stage_state", {"node0": i})
+    reopened = EventLog(log.path, lambda: {}, segment_max=2, clock=clock)
+    clock.t += 1
+    reopened.record("manual_stage", {"node0": 9})
+    state = reopened.state_at(clock.t)["state"]
+    assert state["stage_state"] == {"node0": 2}
+    assert state["manual_stage"] == {"node0": 9}
+
+
+def test_compact_and_expire(tmp_path):
+    log, clock = make_log(tmp_path, segment_max=3, compact_days=1,
+                          compact_resolution=60, retention_days=10)
+    for i in range(6):
+        clock.t += 1
+        log.record("hardware", {"t": i}, node="node0")
+    clock.t += 1
+    log.record("hardware", {"t": 6}, node="node0")
+    last_old = clock.t - 1
+
+    clock.t += 2 * 86400
+    assert log.checkpoints == 3
+    log.compact()
+    names = sorted(p.name for p in log.path.glob("seg-*"))
+    # both closed segments were compacted, then merged into one
+    assert sum(n.endswith(".cmp.jsonl") for n in names) == 1
+    assert log.checkpoints == 2
+    assert log.state_at(last_old)["state"]["hardware"]["node0"] == {"t": 5}
+
+    clock.t += 20 * 86400
+    log.record("hardware", {"t": 7}, node="node0")
+    log.compact()
+    assert log.state_at(last_old) is None
+    assert log.state_at(clock.t)["state"]["hardware"]["node0"] == {"t": 7}
+
+
+@pytest.mark.parametrize("value", ["1e20", "99999999999999", "nan", "inf", "yesterday"])
+def test_parse_ts_rejects_out_of_range(value):
+    with pytest.raises(ValueError):
+        parse_ts(value)
+
+
+def test_parse_ts_formats():
+    assert parse_ts("1700000000") == 1700000000.0
+    assert parse_ts("2025-01-01T00:00:00Z") == 1735689600.0
+    assert parse_ts("2025-01-01T00:00:00") == 1735689600.0
+
+
+def test_merge_drops_checkpoints(tmp_path):
+    log, clock = make_log(tmp_path, segment_max=10, compact_days=1,
+                          compact_resolution=1, merge_bytes=10_000)
+    marks = []
+    for i in range(200):
+        clock.t += 2
+        log.record("hardware", {"t": i}, node=f"node{i % 5}")
+        marks.append((clock.t, i))
+    before = log.checkpoints
+    clock.t += 2 * 86400
+    log.compact()
+    log.compact()   # idempotent: nothing left to merge
+    assert before == 20
+    assert log.checkpoints < before // 2
+    for ts, i in marks[::17]:
+        hw = log.state_at(ts)["state"]["hardware"]
+        assert hw[f"node{i % 5}"] == {"t": i}